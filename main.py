@@ -1,11 +1,17 @@
 import configparser
 import hashlib
+import json
+import os
 import re
 import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from zoneinfo import ZoneInfo
 import requests
-import pytz
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Fix for DeprecationWarning in Python 3.12+
 def adapt_datetime_iso(val):
@@ -15,35 +21,105 @@ sqlite3.register_adapter(datetime, adapt_datetime_iso)
 
 CONFIG_FILE = "config.ini"
 DB_FILE = "sent_notifications.db"
-
-DATE_REGEX = re.compile(r"📅\s*(?P<date>\d{4}-\d{2}-\d{2})")
-TIME_REGEX = re.compile(r"⏰\s*(?P<time>\d{2}:\d{2})")
-TAG_REGEX = re.compile(r"(#\S+)")
+CACHE_FILE = "file_cache.json"
+# Bump whenever parse_file output changes so stale cached tasks are discarded
+CACHE_VERSION = 3
+FLUSH_BATCH_SIZE = 50
+FLUSH_INTERVAL_SECONDS = 5
+SQLITE_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+PARSE_CHUNK_SIZE = 16
+GOTIFY_TIMEOUT = (3, 10)
+GOTIFY_WORKERS = 8
+
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=GOTIFY_WORKERS,
+    max_retries=Retry(total=2, backoff_factor=0.2),
+)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
+# A tag ends where a date or time marker begins, as if those were removed first
+TASK_FIELDS_REGEX = re.compile(
+    r"📅\s*(?P<date>\d{4}-\d{2}-\d{2})"
+    r"|⏰\s*(?P<time>\d{2}:\d{2})"
+    r"|(?P<tag>#(?:(?!📅\s*\d{4}-\d{2}-\d{2}|⏰\s*\d{2}:\d{2})\S)+)"
+)
 TASK_MARKER_REGEX = re.compile(r"^\s*-\s*\[\s*\]\s*")
+TASK_MARKER_FILE_REGEX = re.compile(r"^\s*-\s*\[\s*\]", re.MULTILINE)
 
 def parse_task_line(line):
+    # Cheap prefilter: most lines in a note are prose, not list items
+    if not line.lstrip().startswith("-") or "]" not in line:
+        return None
     if not TASK_MARKER_REGEX.match(line):
         return None
 
     original_text = TASK_MARKER_REGEX.sub(" ", line).strip()
 
-    date_match = DATE_REGEX.search(original_text)
-    time_match = TIME_REGEX.search(original_text)
+    date_str = None
+    time_str = None
+    tags = []
+    text_parts = []
+    last_end = 0
+    for match in TASK_FIELDS_REGEX.finditer(original_text):
+        text_parts.append(original_text[last_end:match.start()])
+        last_end = match.end()
+        if match.group("tag"):
+            tags.append(match.group("tag"))
+        elif match.group("date"):
+            date_str = date_str or match.group("date")
+        else:
+            time_str = time_str or match.group("time")
+    text_parts.append(original_text[last_end:])
+
+    clean_text = " ".join("".join(text_parts).split())
 
-    date_str = date_match.group("date") if date_match else None
-    time_str = time_match.group("time") if time_match else None
+    return {"text": clean_text, "date": date_str, "time": time_str, "tags": tags}
 
-    clean_text = original_text
-    if date_match:
-        clean_text = clean_text.replace(date_match.group(0), "")
-    if time_match:
-        clean_text = clean_text.replace(time_match.group(0), "")
+def parse_file(path_str):
+    data = Path(path_str).read_text(encoding="utf-8", errors="ignore")
+    # Only dated tasks matter; a substring check is far cheaper than the regex
+    if "📅" not in data or not TASK_MARKER_FILE_REGEX.search(data):
+        return []
 
-    tags = TAG_REGEX.findall(clean_text)
-    clean_text = TAG_REGEX.sub("", clean_text).strip()
-    clean_text = " ".join(clean_text.split())
+    tasks = []
+    for line in data.split("\n"):
+        parsed_data = parse_task_line(line)
+        if parsed_data and parsed_data["date"]:
+            tasks.append(parsed_data)
+    return tasks
 
-    return {"text": clean_text, "date": date_str, "time": time_str, "tags": tags}
+def load_file_cache():
+    try:
+        if Path(CACHE_FILE).exists():
+            cache = json.loads(Path(CACHE_FILE).read_text(encoding="utf-8"))
+            if (
+                isinstance(cache, dict)
+                and cache.get("version") == CACHE_VERSION
+                and isinstance(cache.get("files"), dict)
+            ):
+                return {
+                    path_str: entry
+                    for path_str, entry in cache["files"].items()
+                    if isinstance(entry, dict)
+                    and isinstance(entry.get("mtime_ns"), int)
+                    and isinstance(entry.get("size"), int)
+                    and isinstance(entry.get("tasks"), list)
+                }
+    except (OSError, ValueError) as e:
+        print(f"File cache read error: {e}")
+    return {}
+
+def save_file_cache(file_cache):
+    try:
+        Path(CACHE_FILE).write_text(
+            json.dumps({"version": CACHE_VERSION, "files": file_cache}),
+            encoding="utf-8",
+        )
+    except OSError as e:
+        print(f"File cache write error: {e}")
 
 def cleanup_database():
     try:
@@ -55,17 +131,22 @@ def cleanup_database():
 
 def setup_database():
     try:
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                CREATE TABLE IF NOT EXISTS sent_notifications (
-                    task_id TEXT PRIMARY KEY,
-                    sent_at TIMESTAMP
-                )
+        conn = sqlite3.connect(DB_FILE)
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-64000")
+        cursor.execute(
             """
+            CREATE TABLE IF NOT EXISTS sent_notifications (
+                task_id BLOB PRIMARY KEY,
+                sent_at TIMESTAMP
             )
-            conn.commit()
+        """
+        )
+        conn.commit()
+        return conn
     except sqlite3.Error as e:
         print(f"Database setup error: {e}")
         raise
@@ -77,36 +158,60 @@ def get_config():
     config.read(CONFIG_FILE)
     return config
 
-def generate_task_id(file_path, task_text):
-    return hashlib.sha1(f"{file_path}:{task_text}".encode("utf-8")).hexdigest()
+def generate_task_id(path_prefix, task_text):
+    return hashlib.blake2b(
+        path_prefix + task_text.encode("utf-8"), digest_size=16
+    ).digest()
 
-def is_notification_sent(task_id):
+def load_sent_ids(conn):
     try:
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT 1 FROM sent_notifications WHERE task_id = ?", (task_id,)
+        cursor = conn.cursor()
+        cursor.execute("SELECT task_id FROM sent_notifications")
+        return {row[0] for row in cursor.fetchall()}
+    except sqlite3.Error as e:
+        print(f"Database read error: {e}")
+        raise
+
+def claim_notification(conn, task_id):
+    # Insert-or-skip in one statement: a row back means this run owns the task
+    try:
+        if SQLITE_HAS_RETURNING:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO sent_notifications (task_id, sent_at) "
+                "VALUES (?, ?) RETURNING 1",
+                (task_id, datetime.now()),
             )
             return cursor.fetchone() is not None
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO sent_notifications (task_id, sent_at) VALUES (?, ?)",
+            (task_id, datetime.now()),
+        )
+        return cursor.rowcount == 1
     except sqlite3.Error as e:
         print(f"Database check error: {e}")
-        return True
+        return False
 
-def mark_notification_as_sent(task_id):
+def release_notification(conn, task_id):
     try:
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO sent_notifications (task_id, sent_at) VALUES (?, ?)",
-                (task_id, datetime.now()),
-            )
-            conn.commit()
+        conn.execute("DELETE FROM sent_notifications WHERE task_id = ?", (task_id,))
+    except sqlite3.Error as e:
+        print(f"Database write error: {e}")
+
+def flush_sent_notifications(conn, pending_inserts):
+    if not pending_inserts:
+        return
+    try:
+        conn.executemany(
+            "INSERT OR IGNORE INTO sent_notifications (task_id, sent_at) VALUES (?, ?)",
+            pending_inserts,
+        )
+        conn.commit()
     except sqlite3.Error as e:
         print(f"Database write error: {e}")
+    pending_inserts.clear()
 
-def format_notification(task_text, original_task_time, tags, file_name):
+def format_notification(task_text, original_task_time, tags, clean_file_name):
     title = "✅️ New task"
-    clean_file_name = Path(file_name).stem
     tags_str = ", ".join(tags) if tags else "No"
 
     message_parts = [f"📝 {task_text.strip()}"]
@@ -120,10 +225,11 @@ def format_notification(task_text, original_task_time, tags, file_name):
     message = "\n".join(message_parts)
     return title, message
 
-def send_gotify_notification(server_url, token, title, message):
+def send_gotify_notification(url, title, message):
     try:
-        url = f"{server_url}/message?token={token}"
-        response = requests.post(url, data={"title": title, "message": message})
+        response = SESSION.post(
+            url, data={"title": title, "message": message}, timeout=GOTIFY_TIMEOUT
+        )
         response.raise_for_status()
         print(f"Notification '{title}' sent successfully.")
         return True
@@ -131,66 +237,157 @@ def send_gotify_notification(server_url, token, title, message):
         print(f"Gotify notification error: {e}")
         return False
 
-def find_and_process_tasks(config):
+def dispatch_notifications(conn, gotify_url, notifications):
+    def send_one(notification):
+        return send_gotify_notification(
+            gotify_url, notification["title"], notification["message"]
+        )
+
+    pending_inserts = []
+    last_flush = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=GOTIFY_WORKERS) as executor:
+        results = executor.map(send_one, notifications)
+        for notification, sent in zip(notifications, results):
+            if notification["claimed"]:
+                if not sent:
+                    release_notification(conn, notification["task_id"])
+                continue
+            if not sent:
+                continue
+            pending_inserts.append((notification["task_id"], datetime.now()))
+
+            if (
+                len(pending_inserts) >= FLUSH_BATCH_SIZE
+                or time.monotonic() - last_flush >= FLUSH_INTERVAL_SECONDS
+            ):
+                flush_sent_notifications(conn, pending_inserts)
+                last_flush = time.monotonic()
+
+    flush_sent_notifications(conn, pending_inserts)
+
+def walk_markdown_files(root, exclude_dirs, relative_dir=""):
+    try:
+        entries = os.scandir(root)
+    except OSError as e:
+        print(f"Directory read error: {e}")
+        return
+
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                entry_relative_dir = (
+                    f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+                )
+                if entry_relative_dir in exclude_dirs:
+                    continue
+                yield from walk_markdown_files(
+                    entry.path, exclude_dirs, entry_relative_dir
+                )
+            elif entry.name.endswith(".md") and entry.is_file():
+                stat = entry.stat()
+                yield entry.path, (stat.st_mtime_ns, stat.st_size)
+
+def find_and_process_tasks(config, conn):
     vault_path = Path(config["obsidian"]["vault_path"])
     default_time_str = config["settings"]["default_notification_time"]
+    default_time = datetime.strptime(default_time_str, "%H:%M").time()
     timezone_str = config.get("settings", "timezone", fallback="UTC")
-    timezone = pytz.timezone(timezone_str)
+    timezone = ZoneInfo(timezone_str)
 
     exclude_dirs = {
         d.strip() for d in config["obsidian"]["exclude_dirs"].split(",") if d.strip()
     }
-    now = datetime.now(timezone)
-
-    all_md_files = list(vault_path.rglob("*.md"))
-    filtered_files = []
-    
-    for md_file in all_md_files:
-        relative_path = md_file.relative_to(vault_path)
-        file_dir_path = str(relative_path.parent) if relative_path.parent != Path('.') else ''
-        
-        should_exclude = False
-        for exclude_dir in exclude_dirs:
-            if file_dir_path == exclude_dir or file_dir_path.startswith(exclude_dir + '/'):
-                should_exclude = True
-                break
-        
-        if not should_exclude:
-            filtered_files.append(md_file)
-
-    for md_file in filtered_files:
-        with open(md_file, "r", encoding="utf-8") as f:
-            for line in f:
-                parsed_data = parse_task_line(line)
-                if not parsed_data or not parsed_data["date"]:
+    # Compare in the configured timezone's wall-clock time
+    now_naive = datetime.now(timezone).replace(tzinfo=None)
+    today_str = now_naive.strftime("%Y-%m-%d")
+    now_time = (now_naive.hour, now_naive.minute)
+    default_due_time = (default_time.hour, default_time.minute)
+    gotify_url = f'{config["gotify"]["server_url"]}/message?token={config["gotify"]["token"]}'
+    preload_sent_ids = config.getboolean("settings", "preload_sent_ids", fallback=True)
+    sent_ids = load_sent_ids(conn) if preload_sent_ids else set()
+    notifications = []
+
+    # Size as well as mtime: coarse-mtime filesystems can hide quick re-edits
+    file_stats = dict(walk_markdown_files(str(vault_path), exclude_dirs))
+    cached_files = load_file_cache()
+    changed_files = [
+        path_str
+        for path_str, (mtime_ns, size) in file_stats.items()
+        if (
+            cached_files.get(path_str, {}).get("mtime_ns") != mtime_ns
+            or cached_files[path_str].get("size") != size
+        )
+    ]
+
+    # A single chunk is cheaper to parse inline than to fork workers for
+    if len(changed_files) <= PARSE_CHUNK_SIZE:
+        parsed_files = list(map(parse_file, changed_files))
+    else:
+        chunk_count = -(-len(changed_files) // PARSE_CHUNK_SIZE)
+        max_workers = min(os.cpu_count() or 1, chunk_count)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            parsed_files = list(
+                executor.map(parse_file, changed_files, chunksize=PARSE_CHUNK_SIZE)
+            )
+
+    for path_str, tasks in zip(changed_files, parsed_files):
+        mtime_ns, size = file_stats[path_str]
+        cached_files[path_str] = {
+            "mtime_ns": mtime_ns,
+            "size": size,
+            "tasks": tasks,
+        }
+
+    file_cache = {path_str: cached_files[path_str] for path_str in file_stats}
+    if changed_files or len(file_cache) != len(cached_files):
+        save_file_cache(file_cache)
+
+    for path_str, entry in file_cache.items():
+        clean_file_name = Path(path_str).stem
+        path_prefix = path_str.encode("utf-8") + b":"
+        for parsed_data in entry["tasks"]:
+            # YYYY-MM-DD strings compare correctly as plain strings
+            date_str = parsed_data["date"]
+            if date_str > today_str:
+                continue
+
+            task_time_str = parsed_data["time"]
+            if date_str == today_str:
+                # Regex guarantees the HH:MM shape, so slice directly
+                if task_time_str:
+                    due_time = (int(task_time_str[:2]), int(task_time_str[3:5]))
+                else:
+                    due_time = default_due_time
+                if now_time < due_time:
                     continue
 
-                task_text = parsed_data["text"]
-                task_id = generate_task_id(str(md_file), task_text)
+            task_text = parsed_data["text"]
+            task_id = generate_task_id(path_prefix, task_text)
 
-                if is_notification_sent(task_id):
-                    continue
+            if task_id in sent_ids:
+                continue
+            if not preload_sent_ids and not claim_notification(conn, task_id):
+                continue
+
+            title, message = format_notification(
+                task_text,
+                task_time_str,
+                parsed_data["tags"],
+                clean_file_name,
+            )
+
+            notifications.append(
+                {
+                    "task_id": task_id,
+                    "title": title,
+                    "message": message,
+                    "claimed": not preload_sent_ids,
+                }
+            )
+            sent_ids.add(task_id)
 
-                task_time_str = parsed_data["time"] or default_time_str
-                due_datetime_str = f'{parsed_data["date"]} {task_time_str}'
-                naive_due_datetime = datetime.strptime(due_datetime_str, "%Y-%m-%d %H:%M")
-                due_datetime = timezone.localize(naive_due_datetime)
-
-                if now >= due_datetime:
-                    title, message = format_notification(
-                        task_text,
-                        parsed_data["time"],
-                        parsed_data["tags"],
-                        md_file.name,
-                    )
-
-                    if send_gotify_notification(
-                        config["gotify"]["server_url"],
-                        config["gotify"]["token"],
-                        title,
-                        message,
-                    ):
-                        mark_notification_as_sent(task_id)
+    dispatch_notifications(conn, gotify_url, notifications)
 
 def main():
     try:
@@ -199,7 +396,7 @@ def main():
         
         default_time_str = config["settings"]["default_notification_time"]
         timezone_str = config.get("settings", "timezone", fallback="UTC")
-        timezone = pytz.timezone(timezone_str)
+        timezone = ZoneInfo(timezone_str)
         now = datetime.now(timezone)
         
         default_time = datetime.strptime(default_time_str, "%H:%M").time()
@@ -210,8 +407,12 @@ def main():
             cleanup_database()
             return
         
-        setup_database()
-        find_and_process_tasks(config)
+        conn = setup_database()
+        try:
+            with conn:
+                find_and_process_tasks(config, conn)
+        finally:
+            conn.close()
         print("Watcher run complete.")
     except (FileNotFoundError, KeyError, configparser.Error) as e:
         print(f"Configuration error: {e}")